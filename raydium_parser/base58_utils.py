@@ -0,0 +1,41 @@
+from types import ModuleType
+
+try:
+    import based58 as _based58
+except ImportError:
+    _based58: ModuleType | None = None
+
+B58_ALPHABET = b"123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+# Byte value -> digit value, 255 for bytes outside the alphabet
+_B58_MAP = bytes(B58_ALPHABET.index(c) if c in B58_ALPHABET else 255 for c in range(256))
+
+# 58**9 < 2**64, so 9 digits always fit a machine word before touching the Python bigint
+_CHUNK_SIZE = 9
+_CHUNK_BASE = 58**_CHUNK_SIZE
+
+
+def b58decode_py(data: bytes) -> bytes:
+    """Pure-Python base58 decoder using a precomputed digit table and 9-digit chunked accumulation."""
+    stripped = data.lstrip(b"1")
+    leading_zeros = len(data) - len(stripped)
+
+    if stripped.translate(None, B58_ALPHABET):
+        raise ValueError(f"Invalid base58 string: {data!r}")
+
+    num = 0
+    for start in range(0, len(stripped), _CHUNK_SIZE):
+        chunk = stripped[start : start + _CHUNK_SIZE]
+        chunk_value = 0
+        for c in chunk:
+            chunk_value = chunk_value * 58 + _B58_MAP[c]
+        num = num * (_CHUNK_BASE if len(chunk) == _CHUNK_SIZE else 58 ** len(chunk)) + chunk_value
+
+    return b"\0" * leading_zeros + num.to_bytes((num.bit_length() + 7) // 8, "big")
+
+
+def b58decode(data: str) -> bytes:
+    """Decodes a base58 string, using the based58 Rust bindings when installed."""
+    if _based58 is not None:
+        return _based58.b58decode(data.encode())
+    return b58decode_py(data.encode())
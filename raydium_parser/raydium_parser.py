@@ -1,7 +1,9 @@
-from collections.abc import Iterator
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
 from dataclasses import dataclass
 from typing import Literal, cast, Optional, Tuple, TypeAlias
 
+from solders.hash import Hash
 from solders.message import Message
 from solders.signature import Signature
 from solders.pubkey import Pubkey
@@ -11,10 +13,11 @@ from solders.transaction_status import (
     UiConfirmedBlock,
     UiCompiledInstruction,
     UiTransactionStatusMeta,
-    UiTransactionTokenBalance
 )
-import base58
 import logging
+import struct
+
+from raydium_parser.base58_utils import b58decode
 
 logging.basicConfig(
     level=logging.INFO,
@@ -26,22 +29,34 @@ logger = logging.getLogger(__name__)
 RAYDIUM_PROGRAMS = {
     "675kPX9MHTjS2zt1qfr1NYHuzeLXfQM9H24wFSUt1Mp8",  # Legacy AMM v4
 }
+RAYDIUM_PROGRAM_IDS = frozenset(Pubkey.from_string(program) for program in RAYDIUM_PROGRAMS)
 
 # Instruction discriminators for Standard/Legacy AMM types
 SWAP_IN_INSTRUCTION_DISCRIMINATOR = 9
 SWAP_OUT_INSTRUCTION_DISCRIMINATOR = 11
-SWAP_INSTRUCTION_DISCRIMINATOR = [SWAP_IN_INSTRUCTION_DISCRIMINATOR, SWAP_OUT_INSTRUCTION_DISCRIMINATOR]
+SWAP_INSTRUCTION_DISCRIMINATOR = frozenset((SWAP_IN_INSTRUCTION_DISCRIMINATOR, SWAP_OUT_INSTRUCTION_DISCRIMINATOR))
+
+# Standard/Legacy AMM swap data layout: discriminator (u8) followed by two little-endian u64 amounts.
+# SWAP_DATA_LAYOUTS maps every discriminator byte to the (offset, side) of its limit amount, None if not a swap.
+SWAP_AMOUNT_LAYOUT = struct.Struct("<Q")
+_swap_data_layouts: list[Optional[Tuple[int, Literal["mint_in", "mint_out"]]]] = [None] * 256
+_swap_data_layouts[SWAP_IN_INSTRUCTION_DISCRIMINATOR] = (9, "mint_out")  # minimum amount out
+_swap_data_layouts[SWAP_OUT_INSTRUCTION_DISCRIMINATOR] = (1, "mint_in")  # maximum amount in
+SWAP_DATA_LAYOUTS = tuple(_swap_data_layouts)
 
 PoolIndices: TypeAlias = Tuple[int, int]
 BalanceDiff: TypeAlias = Tuple[int, int, bool]
 PoolBalances: TypeAlias = Tuple[int, int]
-@dataclass
+PreTokenBalances: TypeAlias = dict[int, int]
+PostTokenBalances: TypeAlias = dict[int, Tuple[int, Pubkey]]
+TokenBalances: TypeAlias = Tuple[PreTokenBalances, PostTokenBalances]
+@dataclass(slots=True, frozen=True)
 class RaydiumSwap:
     slot: int
     index_in_slot: int
     index_in_tx: int
 
-    signature: str
+    signature: Signature
 
     was_successful: bool
 
@@ -57,112 +72,183 @@ class RaydiumSwap:
     post_pool_balance_mint_out: int
 
 
-def get_mint_in_out(pool_in_index: int, pool_out_index: int, meta: UiTransactionStatusMeta) -> tuple[Pubkey, Pubkey]:
+SwapSink: TypeAlias = Callable[[RaydiumSwap], None]
+TxParseResult: TypeAlias = Tuple[int, int]
+
+# Blocks re-fetched after RPC retries or reorgs are served from here by parse_block_cached
+BLOCK_CACHE_SIZE = 64
+_block_cache: OrderedDict[Tuple[Hash, int], tuple[RaydiumSwap, ...]] = OrderedDict()
+
+def get_mint_in_out(pool_in_index: int, pool_out_index: int, post_balances: PostTokenBalances) -> tuple[Pubkey, Pubkey]:
     """
-    Returns the mint_in and mint_out Pubkeys from the account keys list.
+    Returns the mint_in and mint_out Pubkeys of the pool accounts from the post token balances.
     """
-    mint_in = None
-    mint_out = None
-
-    if meta.post_token_balances:
-        for account in meta.post_token_balances:
-            if account.account_index == pool_in_index:
-                mint_in = account.mint
-            elif account.account_index == pool_out_index:
-                mint_out = account.mint
-    
-    if mint_in is None or mint_out is None:
+    post_in = post_balances.get(pool_in_index)
+    post_out = post_balances.get(pool_out_index)
+
+    if post_in is None or post_out is None:
         raise ValueError("Mint in or mint out not found")
 
-    return mint_in, mint_out
+    return post_in[1], post_out[1]
 
 def parse_block(block: UiConfirmedBlock, slot: int) -> Iterator[RaydiumSwap]:
     """
     Processes a block of transactions and returns an iterator of RaydiumSwap objects.
     """
-    if not block.transactions:
+    # solders getters copy the underlying Rust data on every access, so read each one only once
+    transactions = block.transactions
+    if not transactions:
         logger.info("No transactions found in block")
         return
 
     swaps_found = 0
     instruction_count = 0
 
-    for tx_index, tx in enumerate(block.transactions):
-        if not tx or not hasattr(tx, "transaction") or not hasattr(tx, "meta"):
-            continue
+    for tx_index, tx in enumerate(transactions):
+        swaps: list[RaydiumSwap] = []
+        tx_swaps_found, tx_instruction_count = _parse_tx(tx, slot, tx_index, swaps.append)
+        swaps_found += tx_swaps_found
+        instruction_count += tx_instruction_count
+        yield from swaps
 
-        tx = cast(EncodedTransactionWithStatusMeta, tx)
-        meta = cast(UiTransactionStatusMeta, tx.meta)
-        transaction = cast(Transaction, tx.transaction)
-        message = cast(Message, transaction.message)
-        was_successful = meta.err is None
-
-        # Get complete list of accounts including loaded addresses
-        all_account_keys = list(message.account_keys)
-        if hasattr(meta, "loaded_addresses") and meta.loaded_addresses:
-            if hasattr(meta.loaded_addresses, "writable"):
-                all_account_keys.extend(meta.loaded_addresses.writable)
-            if hasattr(meta.loaded_addresses, "readonly"):
-                all_account_keys.extend(meta.loaded_addresses.readonly)
-
-        # Collect all instructions
-        all_instructions = []
-        all_instructions.extend(message.instructions)
-        if meta.inner_instructions:
-            for inner_ix in meta.inner_instructions:
-                all_instructions.extend(inner_ix.instructions)
-                
-        # Process main instructions
-        for ix_index, ix in enumerate(all_instructions):
-            instruction_count += 1
-            try:
-                # Cast to UiCompiledInstruction since we only handle those
-                if not isinstance(ix, UiCompiledInstruction):
-                    continue
-                
-                if ix.program_id_index >= len(all_account_keys):
-                    continue
-
-                program_id = str(all_account_keys[ix.program_id_index])
-                
-                if program_id in RAYDIUM_PROGRAMS:
-                    swap = parse_raydium_swap_from_ui_compiled_instruction(
-                        ix, message, meta, transaction, slot, tx_index, ix_index, was_successful
-                    )
-                    if swap:
-                        swaps_found += 1
-                        yield swap
-            except Exception as e:
-                logger.error(f"Error processing instruction {ix_index}: {e}")
-                continue
+    _log_block_statistics(slot, swaps_found, instruction_count)
+
+
+def parse_block_into(block: UiConfirmedBlock, slot: int, sink: SwapSink) -> None:
+    """
+    Processes a block of transactions and passes every RaydiumSwap found to sink as soon as it is parsed.
+    """
+    transactions = block.transactions
+    if not transactions:
+        logger.info("No transactions found in block")
+        return
 
+    swaps_found = 0
+    instruction_count = 0
+
+    for tx_index, tx in enumerate(transactions):
+        tx_swaps_found, tx_instruction_count = _parse_tx(tx, slot, tx_index, sink)
+        swaps_found += tx_swaps_found
+        instruction_count += tx_instruction_count
+
+    _log_block_statistics(slot, swaps_found, instruction_count)
+
+
+def parse_block_cached(block: UiConfirmedBlock, slot: int) -> tuple[RaydiumSwap, ...]:
+    """
+    Same as parse_block, but keeps the swaps of the last BLOCK_CACHE_SIZE blocks keyed by blockhash and slot.
+    """
+    key = (block.blockhash, slot)
+    cached_swaps = _block_cache.get(key)
+    if cached_swaps is not None:
+        _block_cache.move_to_end(key)
+        return cached_swaps
+
+    swaps: list[RaydiumSwap] = []
+    parse_block_into(block, slot, swaps.append)
+    cached_swaps = _block_cache[key] = tuple(swaps)
+    if len(_block_cache) > BLOCK_CACHE_SIZE:
+        _block_cache.popitem(last=False)
+    return cached_swaps
+
+
+def _log_block_statistics(slot: int, swaps_found: int, instruction_count: int) -> None:
     logger.info(f"\nSwap parsing statistics for block {slot}:")
     logger.info(f"Total swaps found: {swaps_found}")
-    logger.info(f"Total instructions processed: {instruction_count}")
+    logger.info(f"Total instructions in Raydium transactions: {instruction_count}")
 
 
-def _parse_swap_instruction(ix: UiCompiledInstruction) -> tuple[int, Literal["mint_in", "mint_out"]]:
+def _parse_tx(tx: EncodedTransactionWithStatusMeta, slot: int, tx_index: int, sink: SwapSink) -> TxParseResult:
     """
-    Decodes swap instruction data and returns a tuple (limit_amount, limit_side).
+    Parses a single transaction, passing its swaps to sink, and returns the number of swaps and instructions processed.
+
+    Transactions without a Raydium account key are skipped before their instructions are read and count 0 instructions.
     """
-    data = base58.b58decode(ix.data)
-    discriminator = data[0]
-    # Format for Standard/Legacy AMM swaps
-    if discriminator == SWAP_IN_INSTRUCTION_DISCRIMINATOR:
-        limit_amount = int.from_bytes(data[9:17], "little")
-        return limit_amount, "mint_out"
-    elif discriminator == SWAP_OUT_INSTRUCTION_DISCRIMINATOR:
-        limit_amount = int.from_bytes(data[1:9], "little")
-        return limit_amount, "mint_in"
+    swaps_found = 0
+    instruction_count = 0
+
+    meta = tx.meta
+    if meta is None:
+        return swaps_found, instruction_count
+
+    meta = cast(UiTransactionStatusMeta, meta)
+    transaction = cast(Transaction, tx.transaction)
+    message = cast(Message, transaction.message)
+    was_successful = meta.err is None
+
+    # Get complete list of accounts including loaded addresses
+    all_account_keys = list(message.account_keys)
+    loaded_addresses = meta.loaded_addresses
+    if loaded_addresses:
+        all_account_keys.extend(loaded_addresses.writable)
+        all_account_keys.extend(loaded_addresses.readonly)
+
+    # Most transactions never touch Raydium, skip them before any per-key or per-instruction work
+    if RAYDIUM_PROGRAM_IDS.isdisjoint(all_account_keys):
+        return swaps_found, instruction_count
+
+    # Indices of Raydium programs in this transaction
+    raydium_program_indices = {
+        i for i, account_key in enumerate(all_account_keys) if account_key in RAYDIUM_PROGRAM_IDS
+    }
+
+    # Collect all instructions
+    all_instructions = []
+    all_instructions.extend(message.instructions)
+    inner_instructions = meta.inner_instructions
+    if inner_instructions:
+        for inner_ix in inner_instructions:
+            all_instructions.extend(inner_ix.instructions)
+
+    # Token balances are only indexed once a Raydium instruction shows up, then shared by all its swaps
+    token_balances: Optional[TokenBalances] = None
+
+    # Process main instructions
+    for ix_index, ix in enumerate(all_instructions):
+        instruction_count += 1
+        try:
+            if ix.program_id_index not in raydium_program_indices:
+                continue
+
+            # Cast to UiCompiledInstruction since we only handle those
+            if not isinstance(ix, UiCompiledInstruction):
+                continue
+
+            if token_balances is None:
+                token_balances = index_token_balances(meta)
+
+            swap = parse_raydium_swap_from_ui_compiled_instruction(
+                ix, token_balances, transaction, slot, tx_index, ix_index, was_successful
+            )
+        except Exception as e:
+            logger.error(f"Error processing instruction {ix_index}: {e}")
+            continue
+
+        # Outside the try, errors raised by the caller's sink must propagate
+        if swap:
+            swaps_found += 1
+            sink(swap)
+
+    return swaps_found, instruction_count
+
+
+def _parse_swap_instruction(data: bytes) -> tuple[int, Literal["mint_in", "mint_out"]]:
+    """
+    Parses decoded swap instruction data and returns a tuple (limit_amount, limit_side).
+    """
+    layout = SWAP_DATA_LAYOUTS[data[0]]
+    if layout is None:
+        raise ValueError(f"Unsupported swap instruction format: {data[0]}")
 
-    raise ValueError(f"Unsupported swap instruction format: {data[0]}")
+    offset, limit_side = layout
+    (limit_amount,) = SWAP_AMOUNT_LAYOUT.unpack_from(data, offset)
+    return limit_amount, limit_side
 
 
-def determine_pool_indices_generic(ix: UiCompiledInstruction, message: Message) -> PoolIndices:
+def determine_pool_indices_generic(accounts: bytes) -> PoolIndices:
     """
-    Returns pool account indices (pool_in, pool_out) from the 'accounts' attribute of the instruction.
+    Returns pool account indices (pool_in, pool_out) from the account indices of the instruction.
     """
-    accounts = getattr(ix, "accounts", None)
     if not accounts:
         raise ValueError("No accounts in instruction")
     
@@ -179,34 +265,26 @@ def determine_pool_indices_generic(ix: UiCompiledInstruction, message: Message)
     return pool_in_index, pool_out_index
 
 
-def _is_valid_swap_instruction(ix: UiCompiledInstruction) -> bool:
+def _is_valid_swap_data(data: bytes, accounts: bytes) -> bool:
     """
-    Validates if the instruction is a valid swap.
+    Validates if the decoded instruction data and accounts describe a valid swap.
     """
-    try:
-        data = base58.b58decode(getattr(ix, 'data', ''))
-        if len(data) < 1:
+    # Validate for Standard/Legacy swaps, virtually every Raydium instruction we see
+    if len(data) >= 17 and data[0] in SWAP_INSTRUCTION_DISCRIMINATOR:
+        if len(accounts) < 7:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Invalid standard swap instruction: insufficient accounts, data length: %d", len(data))
             return False
-            
-        # Validate for Standard/Legacy swaps
-        if len(data) >= 17 and data[0] in SWAP_INSTRUCTION_DISCRIMINATOR:
-            accounts = getattr(ix, "accounts", None)
-            if accounts is None or len(accounts) < 7:
-                logger.info(f"Invalid standard swap instruction: insufficient accounts, data length: {len(data)}")
-                return False
-            return True
-            
-        logger.info(f"Invalid swap instruction: unknown format, discriminator: {data[0]}")
-        return False
-    except Exception as e:
-        logger.error(f"Error validating swap instruction: {e}")
-        return False
+        return True
+
+    if data and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Invalid swap instruction: unknown format, discriminator: %d", data[0])
+    return False
 
 
 def parse_raydium_swap_from_ui_compiled_instruction(
     ix: UiCompiledInstruction,
-    message: Message,
-    meta: UiTransactionStatusMeta,
+    token_balances: TokenBalances,
     transaction: Transaction,
     slot: int,
     tx_index: int,
@@ -216,32 +294,43 @@ def parse_raydium_swap_from_ui_compiled_instruction(
     """
     Processes a UiCompiledInstruction as a potential swap.
     """
-    if not _is_valid_swap_instruction(ix):
-        logger.info("Invalid swap instruction (UiCompiledInstruction)")
+    try:
+        data = b58decode(ix.data)
+        accounts = ix.accounts
+    except Exception as e:
+        logger.error(f"Error decoding swap instruction data: {e}")
+        return None
+
+    if not _is_valid_swap_data(data, accounts):
+        logger.debug("Invalid swap instruction (UiCompiledInstruction)")
         return None
 
     try:
-        limit_amount, limit_side = _parse_swap_instruction(ix)
+        limit_amount, limit_side = _parse_swap_instruction(data)
+
+        pool_from_index, pool_to_index = determine_pool_indices_generic(accounts)
 
-        pool_from_index, pool_to_index = determine_pool_indices_generic(ix, message)
+        pre_balances, post_balances = token_balances
 
-        mint_in, mint_out = get_mint_in_out(pool_from_index, pool_to_index, meta)
+        mint_in, mint_out = get_mint_in_out(pool_from_index, pool_to_index, post_balances)
 
-        diff_from, diff_to, should_swap_direction = change_direction(meta, pool_from_index, pool_to_index)
+        diff_from, diff_to, should_swap_direction = change_direction(
+            pre_balances, post_balances, pool_from_index, pool_to_index
+        )
         if should_swap_direction:
 
             diff_from, diff_to = diff_to, diff_from
             mint_in, mint_out = mint_out, mint_in
             pool_from_index, pool_to_index = pool_to_index, pool_from_index
 
-        pool_in_balance, pool_out_balance = get_pool_balances(meta, pool_from_index, pool_to_index)
+        pool_in_balance, pool_out_balance = get_pool_balances(post_balances, pool_from_index, pool_to_index)
         
         signature = cast(Signature, transaction.signatures[0])
         return RaydiumSwap(
             slot=slot,
             index_in_slot=tx_index,
             index_in_tx=ix_index,
-            signature=str(signature),
+            signature=signature,
             was_successful=was_successful,
             mint_in=mint_in,
             mint_out=mint_out,
@@ -249,66 +338,61 @@ def parse_raydium_swap_from_ui_compiled_instruction(
             amount_out=diff_to,
             limit_amount=limit_amount,
             limit_side=limit_side,
-            post_pool_balance_mint_in=int(pool_in_balance),
-            post_pool_balance_mint_out=int(pool_out_balance),
+            post_pool_balance_mint_in=pool_in_balance,
+            post_pool_balance_mint_out=pool_out_balance,
         )
     except Exception as e:
         logger.error(f"Error processing UiCompiledInstruction: {e}")
         return None
 
-def change_direction(meta: UiTransactionStatusMeta, pool_from_index: int, pool_to_index: int) -> BalanceDiff:
+def index_token_balances(meta: UiTransactionStatusMeta) -> TokenBalances:
+    """
+    Returns the pre token amounts and the post token (amount, mint) pairs keyed by account index.
+    """
+    pre_balances = {
+        balance.account_index: int(balance.ui_token_amount.amount) for balance in meta.pre_token_balances or []
+    }
+    post_balances = {
+        balance.account_index: (int(balance.ui_token_amount.amount), balance.mint)
+        for balance in meta.post_token_balances or []
+    }
+    return pre_balances, post_balances
+
+def change_direction(
+    pre_balances: PreTokenBalances, post_balances: PostTokenBalances, pool_from_index: int, pool_to_index: int
+) -> BalanceDiff:
     """
     Returns True if the direction of the swap should be changed.
     """
-    if not meta.pre_token_balances or not meta.post_token_balances:
+    if not pre_balances or not post_balances:
         raise ValueError("No pre or post token balances")
 
-    diff_from = 0
-    diff_to = 0
-
-    # Find matching balances for pool_from
-    for pre_balance in meta.pre_token_balances:
-        if pre_balance.account_index == pool_from_index:
-            for post_balance in meta.post_token_balances:
-                if post_balance.account_index == pool_from_index:
-                    diff_from = balance_diff(pre_balance, post_balance)
-                    break
-            break
-
-    # Find matching balances for pool_to
-    for pre_balance in meta.pre_token_balances:
-        if pre_balance.account_index == pool_to_index:
-            for post_balance in meta.post_token_balances:
-                if post_balance.account_index == pool_to_index:
-                    diff_to = balance_diff(pre_balance, post_balance)
-                    break
-            break
+    diff_from = balance_diff(pre_balances, post_balances, pool_from_index)
+    diff_to = balance_diff(pre_balances, post_balances, pool_to_index)
 
     return (abs(diff_from), abs(diff_to), diff_from < 0 and diff_to > 0)
 
-def balance_diff(pre_balance: UiTransactionTokenBalance, post_balance: UiTransactionTokenBalance) -> int:
+def balance_diff(pre_balances: PreTokenBalances, post_balances: PostTokenBalances, account_index: int) -> int:
     """
-    Returns the difference between the pre and post balance.
+    Returns the difference between the pre and post balance, 0 if either is missing.
     """
-    return int(post_balance.ui_token_amount.amount) - int(pre_balance.ui_token_amount.amount)
+    pre_amount = pre_balances.get(account_index)
+    post_balance = post_balances.get(account_index)
+    if pre_amount is None or post_balance is None:
+        return 0
+    return post_balance[0] - pre_amount
 
-def get_pool_balances(meta: UiTransactionStatusMeta, pool_from_index: int, pool_to_index: int) -> PoolBalances:
+def get_pool_balances(post_balances: PostTokenBalances, pool_from_index: int, pool_to_index: int) -> PoolBalances:
     """
     Returns the balances of the pool_from and pool_to.
     """
-    if not meta.post_token_balances:
+    if not post_balances:
         raise ValueError("No post token balances available")
 
-    pool_from_balance = None
-    pool_to_balance = None
-
-    for balance in meta.post_token_balances:
-        if balance.account_index == pool_from_index:
-            pool_from_balance = balance.ui_token_amount.amount
-        elif balance.account_index == pool_to_index:
-            pool_to_balance = balance.ui_token_amount.amount
+    pool_from_balance = post_balances.get(pool_from_index)
+    pool_to_balance = post_balances.get(pool_to_index)
 
     if pool_from_balance is None or pool_to_balance is None:
         raise ValueError("Pool from index or pool to index not found in post token balances")
 
-    return int(pool_from_balance), int(pool_to_balance)
+    return pool_from_balance[0], pool_to_balance[0]
@@ -1,5 +1,7 @@
 import os
 
+from functools import cache
+
 from solana.rpc.api import Client
 from solders.transaction_status import UiConfirmedBlock
 
@@ -7,6 +9,12 @@ RPC_URL = "https://api.mainnet-beta.solana.com"
 CACHE_DIR = "cached_blocks"
 
 
+@cache
+def _rpc_client() -> Client:
+    # One client per process so repeated fetches reuse its pooled keep-alive connection
+    return Client(RPC_URL)
+
+
 def get_block(slot: int) -> UiConfirmedBlock:
     cache_file = os.path.join(CACHE_DIR, f"{slot}.json")
 
@@ -14,8 +22,7 @@ def get_block(slot: int) -> UiConfirmedBlock:
         with open(cache_file) as f:
             return UiConfirmedBlock.from_json(f.read())
 
-    rpc = Client(RPC_URL)
-    block_data = rpc.get_block(slot, encoding="json", max_supported_transaction_version=0).value
+    block_data = _rpc_client().get_block(slot, encoding="json", max_supported_transaction_version=0).value
 
     if block_data:
         with open(cache_file, "w") as f:
@@ -0,0 +1,17 @@
+from functools import cache
+
+import pytest
+
+from raydium_parser.rpc_utils import get_block
+from tests.constants import SLOT
+
+
+@pytest.fixture(scope="session")
+def load_block():
+    # get_block already reads blocks from cached_blocks/, keep every deserialized block for the whole session
+    return cache(get_block)
+
+
+@pytest.fixture(scope="session")
+def block(load_block):
+    return load_block(SLOT)
@@ -0,0 +1,2 @@
+# Slot of the block cached in cached_blocks/ that the parser tests run against
+SLOT = 316719543
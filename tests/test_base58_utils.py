@@ -0,0 +1,39 @@
+import pytest
+
+from raydium_parser import base58_utils
+from raydium_parser.base58_utils import b58decode, b58decode_py
+
+DECODED = [
+    ("", ""),
+    ("1", "00"),
+    ("111", "000000"),
+    ("2", "01"),
+    ("z", "39"),
+    ("3Mc", "1ef3"),
+    ("11Ldp", "0000010203"),
+    ("675kPX9MHTjS2zt1qfr1NYHuzeLXfQM9H24wFSUt1Mp8", "4bd949c43602c33f207790ed16a3524ca1b9975cf121a2a90cffec7df8b68acd"),
+    ("6NjqAcWx1z1dR6eAekJCgqQ", "09dc850b76de302ebdc4adcd4bb97797db"),  # Legacy AMM v4 swap payload
+]
+
+
+@pytest.mark.parametrize(("encoded", "expected"), DECODED)
+def test_b58decode_py(encoded, expected):
+    assert b58decode_py(encoded.encode()) == bytes.fromhex(expected)
+
+
+@pytest.mark.parametrize(("encoded", "expected"), DECODED)
+def test_b58decode(encoded, expected):
+    assert b58decode(encoded) == bytes.fromhex(expected)
+
+
+@pytest.mark.parametrize(("encoded", "expected"), DECODED)
+def test_b58decode_without_based58(monkeypatch, encoded, expected):
+    monkeypatch.setattr(base58_utils, "_based58", None)
+
+    assert b58decode(encoded) == bytes.fromhex(expected)
+
+
+@pytest.mark.parametrize("encoded", ["0", "O", "I", "l", "3M+c"])
+def test_b58decode_py_rejects_invalid_characters(encoded):
+    with pytest.raises(ValueError, match="Invalid base58"):
+        b58decode_py(encoded.encode())
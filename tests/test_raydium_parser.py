@@ -1,31 +1,86 @@
-import json
-from raydium_parser.raydium_parser import parse_block, RaydiumSwap
-from raydium_parser.rpc_utils import get_block
+from collections import OrderedDict
 
+import pytest
 
-def test_raydium_parser():
-    block = get_block(316719543)
+from raydium_parser import raydium_parser
+from raydium_parser.raydium_parser import parse_block, parse_block_cached, parse_block_into
+from tests.constants import SLOT
 
-    swaps = parse_block(block, 316719543)
 
-    # Convert the iterator to a list to print all swaps
-    swaps_list = list(swaps)
+@pytest.mark.parametrize(
+    ("slot", "expected_total", "lower_bound", "upper_bound"),
+    [
+        # Expected successful count round(809 * 0.06) = 49 with a margin of error round(809 * 0.006) = 5
+        (SLOT, 809, 44, 54),
+    ],
+)
+def test_raydium_parser(load_block, slot, expected_total, lower_bound, upper_bound):
+    block = load_block(slot)
 
-    assert len(swaps_list) == 809, "No swaps were parsed"
-
-    # Filter swaps to only include successful ones
-    successful_swaps = [swap for swap in swaps_list if swap.was_successful]
-
-    # Calculate expected successful count and margin of error
-    expected_successful_count = round(809 * 0.06)
-    margin_of_error = round(809 * 0.006)
-
-    # Calculate lower and upper bounds
-    lower_bound = expected_successful_count - margin_of_error
-    upper_bound = expected_successful_count + margin_of_error
+    # Count all swaps and the successful ones while streaming, stop early once too many succeeded
+    total_swaps = 0
+    successful_swaps = 0
+    for swap in parse_block(block, slot):
+        total_swaps += 1
+        if swap.was_successful:
+            successful_swaps += 1
+            if successful_swaps > upper_bound:
+                break
 
     # Check if the number of successful swaps is within the margin of error
-    assert lower_bound <= len(successful_swaps) <= upper_bound, (
+    assert lower_bound <= successful_swaps <= upper_bound, (
         f"Expected successful swaps to be between {lower_bound} and {upper_bound}, "
-        f"but got {len(successful_swaps)}"
+        f"but got {successful_swaps}"
     )
+
+    assert total_swaps == expected_total, "No swaps were parsed"
+
+
+@pytest.fixture
+def block_cache(monkeypatch):
+    cache = OrderedDict()
+    monkeypatch.setattr(raydium_parser, "_block_cache", cache)
+    return cache
+
+
+@pytest.mark.usefixtures("block_cache")
+def test_parse_block_cached(block):
+    swaps = parse_block_cached(block, SLOT)
+
+    assert len(swaps) == 809
+    assert parse_block_cached(block, SLOT) is swaps, "Repeated block was parsed again"
+
+
+def test_parse_block_cached_misses_on_different_key(block, block_cache):
+    swaps = parse_block_cached(block, SLOT)
+
+    # Same blockhash under another slot, e.g. after a reorg, must not be served from the cache
+    other_swaps = parse_block_cached(block, SLOT + 1)
+
+    assert other_swaps is not swaps
+    assert list(block_cache) == [(block.blockhash, SLOT), (block.blockhash, SLOT + 1)]
+
+
+def test_parse_block_cached_evicts_oldest_block(block, block_cache, monkeypatch):
+    monkeypatch.setattr(raydium_parser, "BLOCK_CACHE_SIZE", 1)
+
+    swaps = parse_block_cached(block, SLOT)
+    parse_block_cached(block, SLOT + 1)
+
+    assert list(block_cache) == [(block.blockhash, SLOT + 1)]
+    assert parse_block_cached(block, SLOT) is not swaps, "Evicted block was served from the cache"
+
+
+def test_parse_block_into(block):
+    swaps = []
+    parse_block_into(block, SLOT, swaps.append)
+
+    assert swaps == list(parse_block(block, SLOT))
+
+
+def test_parse_block_into_propagates_sink_errors(block):
+    def failing_sink(_swap):
+        raise RuntimeError("sink failed")
+
+    with pytest.raises(RuntimeError, match="sink failed"):
+        parse_block_into(block, SLOT, failing_sink)